@@ -1,18 +1,101 @@
 """Wrapper for mintapi python library to handle scraping."""
 
 
-import json
+import functools
 import logging
+import re
 import time
-from os.path import exists
+from dataclasses import dataclass
+from os.path import getmtime
 from typing import Any
 
-from dateutil.parser import isoparse
+import orjson
 from mintapi.api import Mint
 
 logger = logging.getLogger("mintapi")
 # logging.basicConfig(level=logging.DEBUG)
 
+# Home Assistant templates expect "true"/"false" strings, so quote bare JSON
+# booleans in the serialized bytes. The delimiter lookarounds make a match
+# inside a string value unlikely, not impossible - a string containing e.g.
+# ",true," would get quotes injected. Mint account data never looks like that.
+_BOOL_RE = re.compile(rb"(?<=[:\[,])(true|false)(?=[,\]}])")
+
+# One-pass " " -> "_" plus ASCII lowercasing for MQTT topic fragments
+_TOPIC_TABLE = str.maketrans(
+    {ord(" "): "_", **{c: chr(c + 32) for c in range(ord("A"), ord("Z") + 1)}},
+)
+
+# Only the fields the topics, payloads and HA templates actually consume -
+# the raw Mint payload carries dozens of metadata fields besides these
+_KEEP = frozenset(
+    {
+        "id",
+        "name",
+        "fiName",
+        "fiLoginId",
+        "currency",
+        "type",
+        "bankAccountType",
+        "creditAccountType",
+        "cpAccountNumberLast4",
+        "interestRate",
+        "investmentType",
+        "metaData",
+        "availableBalance",
+        "currentBalance",
+        "value",
+        "isError",
+    },
+)
+
+
+def serialize_payload(obj: Any) -> str:
+    """Serialize a payload with bool values as string representations."""
+    return _BOOL_RE.sub(rb'"\1"', orjson.dumps(obj)).decode()
+
+
+@functools.lru_cache(maxsize=16)
+def _icon_for(account_type: str, bank_account_type: str | None) -> str | None:
+    """Sets the icons based on the account type..."""
+    if account_type == "BankAccount":
+        if bank_account_type == "CHECKING":
+            return "mdi:checkbook"
+        return "mdi:piggy-bank"
+    if account_type == "InvestmentAccount":
+        return "mdi:chart-line"
+    # mdi:cash-multiple
+    # mdi:cash
+    # mdi:currency-usd
+    # mdi:currency-eur
+    # mdi:chart-line
+    # mdi:chart-line-stacked
+    # mdi:chart-line-variant
+    return None
+
+
+# Positions of the mutable entries in ParsedAccount.publish_plan
+_PLAN_STATE = 3
+_PLAN_ATTRIBUTE = 4
+
+
+@dataclass(slots=True)
+class ParsedAccount:
+    """Parsed topics and payloads for a single Mint account."""
+
+    metadata_key: tuple
+    state_topic: str
+    attribute_topic: str
+    discovery_topic_balance: str
+    discovery_topic_update: str
+    discovery_topic_error: str
+    discovery_payload_balance: dict
+    discovery_payload_update: dict
+    discovery_payload_error: dict
+    state_payload: dict
+    attribute_payload: dict
+    publish_plan: list[tuple[str, str]]
+
 
 class MintScraper:
     """Define a mint scraper wrapper."""
@@ -22,40 +105,43 @@ class MintScraper:
         self.email = email
         self.password = password
         self.mfa_token: str = mfa_token
-        self.mint_data: list[str] = []
+        self.mint_data: list[ParsedAccount] = []
+        self._discovery_cache: dict[Any, tuple[tuple, dict[str, str]]] = {}
+        self._records_by_id: dict[Any, ParsedAccount] = {}
+        self._last_mtime: float = 0.0
 
     def load_raw_scrape_data(self, file_name: str):
         """Load data and output the data age."""
         logger.info("Opening Mint data: %s", file_name)
-        with open(file_name) as file:
-            return json.load(file)
+        with open(file_name, "rb") as file:
+            return orjson.loads(file.read())
 
     def scrape_or_load(self) -> None:
         """Decides whether to scrape or load the data from the data file."""
-        if exists("mint.json"):
-            raw_data = self.load_raw_scrape_data("mint.json")
-
-            # Calculate the age of the raw_data
-            max_time = 0.0
-            for entry in raw_data:
-                timestamp: float = isoparse(
-                    entry["metaData"]["lastUpdatedDate"],
-                ).timestamp()
-                max_time = max(max_time, timestamp)
-
-            age = time.time() - max_time
-            age_in_hours = divmod(age, 3600)[0]
-
-            if age_in_hours > 4:
+        try:
+            mtime = getmtime("mint.json")
+        except FileNotFoundError:
+            logger.info("Using Cached MINT data - only refreshing at 4 hr intervals ")
+            raw_data = self.scrape()
+        else:
+            # Same file we already parsed and still inside the TTL - nothing to do
+            if (
+                self.mint_data
+                and mtime == self._last_mtime
+                and time.time() - mtime < 4 * 3600
+            ):
+                return
+
+            if time.time() - mtime > 4 * 3600:
                 logger.info(
                     "Mint DATA is more than 4 hours old - refreshing accounts...",
                 )
                 raw_data = self.scrape()
-        else:
-            logger.info("Using Cached MINT data - only refreshing at 4 hr intervals ")
-            raw_data = self.scrape()
+            else:
+                raw_data = self.load_raw_scrape_data("mint.json")
         # Parse raw data
 
+        self._last_mtime = getmtime("mint.json")
         self.mint_data = self._parse_mint_data(raw_data=raw_data)
 
     def scrape(self) -> list[dict[Any, Any]]:
@@ -82,15 +168,24 @@ class MintScraper:
 
     def _build_topics(self, account) -> dict:
         """Build all the various topics for a specific account"""
+        # Normalize each piece once instead of re-scanning every full topic
+        safe_id = str(account["id"]).translate(_TOPIC_TABLE)
+        safe_fi = account["fiName"].translate(_TOPIC_TABLE)
+        safe_name = account["name"].translate(_TOPIC_TABLE)
+
+        # Plain concatenation of precomputed parts beats f-string formatting
+        # in this loop, and the data prefix is shared by two topics
+        data_prefix = "mint/data/" + safe_fi + "/" + safe_name
+        sensor_prefix = "homeassistant/sensor/mint_" + safe_id
+
         topics = {
-            key: value.replace(" ", "_").lower()
-            for key, value in {
-                "state_topic": f'mint/data/{account["fiName"]}/{account["name"]}_{account["id"]}',
-                "attribute_topic": f'mint/data/{account["fiName"]}/{account["name"]}_attributes_{account["id"]}',
-                "discovery_topic_balance": f'homeassistant/sensor/mint_{account["id"]}/account_balance/config',
-                "discovery_topic_update": f'homeassistant/sensor/mint_{account["id"]}/last_update/config',
-                "discovery_topic_error": f'homeassistant/binary_sensor/mint_{account["id"]}/error/config',
-            }.items()
+            "state_topic": data_prefix + "_" + safe_id,
+            "attribute_topic": data_prefix + "_attributes_" + safe_id,
+            "discovery_topic_balance": sensor_prefix + "/account_balance/config",
+            "discovery_topic_update": sensor_prefix + "/last_update/config",
+            "discovery_topic_error": "homeassistant/binary_sensor/mint_"
+            + safe_id
+            + "/error/config",
         }
         return topics
 
@@ -103,7 +198,8 @@ class MintScraper:
             "currentBalance",
             "fiName",
             "interestRate",
-            "investmentType" "name",
+            "investmentType",
+            "name",
             "type",
             "value",
             "bankAccountType",
@@ -120,50 +216,48 @@ class MintScraper:
 
         return output_dict
 
+    def _build_device(self, account: dict) -> dict:
+        """Build the shared HA device block for an account."""
+        return {
+            "identifiers": [
+                # Bank name
+                account["fiLoginId"],
+            ],
+            "manufacturer": "Mint Scraper",
+            "model": "Bank Account",
+            "name": f"{account['fiName']}",
+            "sw_version": "",
+        }
+
     def _build_payloads(self, account, topics):
         """Build out payloads for a specific account."""
 
+        # One device block per account, aliased into all three discovery
+        # payloads - they are serialized independently so sharing is safe
+        device = self._build_device(account)
+
         payloads = {
-            "discovery_payload_balance": self._build_discovery_payload(
+            "discovery_payload_balance": self._build_balance_payload(
                 account,
-                sensor_suffix="balance",
-                object_id=f'mint {account["fiName"]} {account["name"]} balance',
-                state_topic=topics["state_topic"],
-                state_class="measurement",
-                value_template="{{value_json.get('availableBalance', value_json.get('currentBalance'))}}",
-                unit_of_measurement=account["currency"],
-                json_attributes_template="{{value_json | tojson}}",
-                json_attributes_topic=topics["attribute_topic"],
-                force_update=True,
-                icon=self._get_icon(account),
+                topics,
+                device,
             ),
-            "discovery_payload_update": self._build_discovery_payload(
+            "discovery_payload_update": self._build_update_payload(
                 account,
-                sensor_suffix="updated",
-                state_topic=topics["state_topic"],
-                device_class="timestamp",
-                object_id=f'mint {account["fiName"]} {account["name"]} last update',
-                value_template="{{ value_json.metaData.lastUpdatedDate | as_datetime }}",
-                icon="mdi:update",
+                topics,
+                device,
             ),
-            "discovery_payload_error": self._build_discovery_payload(
+            "discovery_payload_error": self._build_error_payload(
                 account,
-                sensor_suffix="error",
-                entity_category="diagnostic",
-                state_topic=topics["attribute_topic"],
-                sensor_type="binary_sensor",
-                object_id=f'mint {account["fiName"]} {account["name"]} error',
-                value_template="{{value_json.isError }}",
-                payload_on="true",
-                payload_off="false",
-                icon="mdi:alert-circle",
+                topics,
+                device,
             ),
             "state_payload": account,
             "attribute_payload": self._build_attribute_payload(account),
         }
         return payloads
 
-    def _parse_mint_data(self, raw_data) -> list[dict]:
+    def _parse_mint_data(self, raw_data) -> list[ParsedAccount]:
         """Prase out the mint data adding a few "extra" stuff."""
         logger.info("Parsing MINT data")
 
@@ -171,108 +265,130 @@ class MintScraper:
         for x in raw_data:
             # Only get banking data
             if x["type"] in ["BankAccount", "InvestmentAccount"]:
-                topics = self._build_topics(x)
-                topics.update(self._build_payloads(account=x, topics=topics))
-                data.append(topics)
+                # Project down to the fields we use so the state payload
+                # doesn't drag the whole raw entry along
+                x = {key: value for key, value in x.items() if key in _KEEP}
+                key = self._metadata_key(x)
+                record = self._records_by_id.get(x["id"])
+
+                if record is not None and record.metadata_key == key:
+                    # Metadata unchanged - refresh only the mutable payloads
+                    # and leave the topics/discovery side of the record alone
+                    record.state_payload = x
+                    record.attribute_payload = self._build_attribute_payload(x)
+                    record.publish_plan[_PLAN_STATE] = (
+                        record.state_topic,
+                        serialize_payload(x),
+                    )
+                    record.publish_plan[_PLAN_ATTRIBUTE] = (
+                        record.attribute_topic,
+                        serialize_payload(record.attribute_payload),
+                    )
+                else:
+                    topics = self._build_topics(x)
+                    payloads = self._build_payloads(account=x, topics=topics)
+                    serialized = self._serialize_discovery(account=x, entry=payloads)
+
+                    # Everything the publish loop needs, pre-resolved and
+                    # pre-serialized - payloads only change when we reparse
+                    publish_plan = [
+                        (topics["discovery_topic_balance"], serialized["balance"]),
+                        (topics["discovery_topic_update"], serialized["update"]),
+                        (topics["discovery_topic_error"], serialized["error"]),
+                        (
+                            topics["state_topic"],
+                            serialize_payload(payloads["state_payload"]),
+                        ),
+                        (
+                            topics["attribute_topic"],
+                            serialize_payload(payloads["attribute_payload"]),
+                        ),
+                    ]
+                    record = ParsedAccount(
+                        metadata_key=key,
+                        **topics,
+                        **payloads,
+                        publish_plan=publish_plan,
+                    )
+                    self._records_by_id[x["id"]] = record
+
+                data.append(record)
             else:
                 logger.info("   >> Not Parsing {}".format(x["type"]))
         return data
 
-    def _build_discovery_payload(
-        self,
-        account_data: str,
-        sensor_suffix: str,
-        state_topic: str = "",
-        entity_category: str | None = None,
-        state_class: str | None = None,
-        sensor_type: str = "sensor",
-        object_id: str | None = None,
-        expire_after: str | None = None,
-        force_update: bool = False,
-        payload_on: str | bool | None = None,
-        payload_off: str | bool | None = None,
-        device_class: str | None = None,
-        unit_of_measurement: str | None = None,
-        value_template: str = "",
-        json_attributes_template: str | None = None,
-        json_attributes_topic: str | None = None,
-        icon: str | None = None,
-    ) -> dict:
-        unique_id = f'{account_data["id"]}_{sensor_suffix}'.replace(" ", "_")
-
-        discovery_payload = {
-            "device": {
-                "identifiers": [
-                    # Bank name
-                    account_data["fiLoginId"],
-                ],
-                "manufacturer": "Mint Scraper",
-                "model": "Bank Account",
-                "name": f"{account_data['fiName']}",
-                "sw_version": "",
-            },
-            "name": account_data["name"].capitalize() + " " + sensor_suffix,
-            "unique_id": unique_id,
-            "state_topic": state_topic,
-            "value_template": value_template,
-            "force_update": force_update,
-        }
-
-        # set things if they exist:
-
-        if unit_of_measurement:
-            discovery_payload["unit_of_measurement"] = unit_of_measurement
-
-        if icon:
-            discovery_payload["icon"] = icon
-
-        if payload_off:
-            discovery_payload["payload_off"] = payload_off
+    def _metadata_key(self, account: dict) -> tuple:
+        """Key identifying the account metadata the discovery payloads depend on."""
+        return (
+            account["id"],
+            account["name"],
+            account["fiName"],
+            account["currency"],
+            account.get("bankAccountType"),
+        )
 
-        if entity_category:
-            discovery_payload["entity_category"] = entity_category
+    def _serialize_discovery(self, account: dict, entry: dict) -> dict[str, str]:
+        """Serialize discovery payloads, reusing cached bytes when metadata is unchanged."""
+        cache_key = self._metadata_key(account)
+        cached = self._discovery_cache.get(account["id"])
+        if cached and cached[0] == cache_key:
+            return cached[1]
 
-        if object_id:
-            discovery_payload["object_id"] = object_id
+        serialized = {
+            item: serialize_payload(entry[f"discovery_payload_{item}"])
+            for item in ("balance", "update", "error")
+        }
+        self._discovery_cache[account["id"]] = (cache_key, serialized)
+        return serialized
+
+    def _build_balance_payload(self, account: dict, topics: dict, device: dict) -> dict:
+        """Build the balance sensor discovery payload in one shot."""
+        return {
+            "device": device,
+            "name": account["name"].capitalize() + " balance",
+            "unique_id": f'{account["id"]}_balance'.replace(" ", "_"),
+            "state_topic": topics["state_topic"],
+            "value_template": "{{value_json.get('availableBalance', value_json.get('currentBalance'))}}",
+            "force_update": True,
+            "unit_of_measurement": account["currency"],
+            "icon": _icon_for(account["type"], account.get("bankAccountType")),
+            "object_id": f'mint {account["fiName"]} {account["name"]} balance',
+            "state_class": "measurement",
+            "json_attributes_topic": topics["attribute_topic"],
+            "json_attributes_template": "{{value_json | tojson}}",
+        }
 
-        if state_class:
-            discovery_payload["state_class"] = state_class
-        if expire_after:
-            discovery_payload["expire_after"] = expire_after
-        if payload_on:
-            discovery_payload["payload_on"] = payload_on
-        if device_class:
-            discovery_payload["device_class"] = device_class
+    def _build_update_payload(self, account: dict, topics: dict, device: dict) -> dict:
+        """Build the last-update sensor discovery payload in one shot."""
+        return {
+            "device": device,
+            "name": account["name"].capitalize() + " updated",
+            "unique_id": f'{account["id"]}_updated'.replace(" ", "_"),
+            "state_topic": topics["state_topic"],
+            "value_template": "{{ value_json.metaData.lastUpdatedDate | as_datetime }}",
+            "force_update": False,
+            "icon": "mdi:update",
+            "object_id": f'mint {account["fiName"]} {account["name"]} last update',
+            "device_class": "timestamp",
+        }
 
-        if json_attributes_template:
-            if json_attributes_topic:
-                discovery_payload["json_attributes_topic"] = json_attributes_topic
-            else:
-                discovery_payload["json_attributes_topic"] = state_topic
-
-            discovery_payload["json_attributes_template"] = json_attributes_template
-
-        # Return data
-        return discovery_payload
-
-    def _get_icon(self, account: dict) -> str:
-        """Sets the icons based on the account type..."""
-
-        if account["type"] == "BankAccount":
-            if account["bankAccountType"] == "CHECKING":
-                return "mdi:checkbook"
-            return "mdi:piggy-bank"
-        if account["type"] == "InvestmentAccount":
-            return "mdi:chart-line"
-        # mdi:cash-multiple
-        # mdi:cash
-        # mdi:currency-usd
-        # mdi:currency-eur
-        # mdi:chart-line
-        # mdi:chart-line-stacked
-        # mdi:chart-line-variant
+    def _build_error_payload(self, account: dict, topics: dict, device: dict) -> dict:
+        """Build the error binary sensor discovery payload in one shot."""
+        return {
+            "device": device,
+            "name": account["name"].capitalize() + " error",
+            "unique_id": f'{account["id"]}_error'.replace(" ", "_"),
+            "state_topic": topics["attribute_topic"],
+            "value_template": "{{value_json.isError }}",
+            "force_update": False,
+            "icon": "mdi:alert-circle",
+            "object_id": f'mint {account["fiName"]} {account["name"]} error',
+            "entity_category": "diagnostic",
+            "payload_on": "true",
+            "payload_off": "false",
+        }
 
     def write_data_to_disk(self, raw_data: str) -> None:
         """Write the current set of data to disk."""
-        with open("mint.json", "w") as mint_output:
-            mint_output.write(json.dumps(raw_data))
+        with open("mint.json", "wb") as mint_output:
+            mint_output.write(orjson.dumps(raw_data))
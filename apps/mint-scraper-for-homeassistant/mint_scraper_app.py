@@ -2,23 +2,18 @@
 from __future__ import annotations
 
 import datetime
-import json
+import itertools
+import os.path
+import threading
+import traceback
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import appdaemon.plugins.mqtt.mqttapi as mqtt
 from mint_scraper import MintScraper
 
 
-# Alpine has some chrome driver issues where chrome/selinium/chromium/chromedriver dont match
-# so we can set a symilnk betweeen crhomium and google-chrome which should make things work
-from pathlib import Path
-
-try:
-    Path("/usr/bin/google-chrome").symlink_to("/usr/lib/chromium/chromium-launcher.sh")
-except FileExistsError:
-    pass
-
-
 class MintScrapperApp(mqtt.Mqtt):
     """Appdaemon app definition."""
 
@@ -42,9 +37,22 @@ class MintScrapperApp(mqtt.Mqtt):
 
         return ret
 
+    def _link_chromium(self) -> None:
+        """Symlink google-chrome to the chromium launcher if needed."""
+        # Alpine has some chrome driver issues where chrome/selinium/chromium/chromedriver dont match
+        # so we can set a symilnk betweeen crhomium and google-chrome which should make things work
+        if not os.path.lexists("/usr/bin/google-chrome"):
+            try:
+                Path("/usr/bin/google-chrome").symlink_to(
+                    "/usr/lib/chromium/chromium-launcher.sh",
+                )
+            except FileExistsError:
+                pass
+
     def initialize(self) -> None:
         """Initialize the Scraping App."""
         self._check_args()
+        self._link_chromium()
         mfa_token = self.args["mint_mfa_token"]
         mint_password = self.args["mint_password"]
         mint_email = self.args["mint_email"]
@@ -58,6 +66,14 @@ class MintScrapperApp(mqtt.Mqtt):
             mfa_token=mfa_token,
         )
 
+        # Selenium scrapes block for many seconds, so they get a dedicated
+        # worker thread instead of tying up an AppDaemon callback thread
+        self._scrape_lock = threading.Lock()
+        self._scrape_pool = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="mint-scrape",
+        )
+
         get_data_interval = 60 * 60
         self.log(
             "-- [callback] Registering Callback: callback_get_data ever %d seconds",
@@ -77,6 +93,15 @@ class MintScrapperApp(mqtt.Mqtt):
         self.log("-- Initializing MQTT")
         self.mqtt = self.get_plugin_api("MQTT")
 
+        # Persistent worker pool acting as the publish queue - publishes from
+        # every callback funnel through the same threads, so we don't pay
+        # pool startup/teardown each hour
+        self._publish_pool = ThreadPoolExecutor(
+            max_workers=16,
+            thread_name_prefix="mqtt-publish",
+        )
+        self._last_payload_hash: dict[str, int] = {}
+
         if self.mqtt.is_client_connected():
             callback_interval = 60 * 60
 
@@ -96,10 +121,31 @@ class MintScrapperApp(mqtt.Mqtt):
                 scraper=scraper,
             )
 
+    def terminate(self) -> None:
+        """Shut down the worker pools on app reload."""
+        for name in ("_publish_pool", "_scrape_pool"):
+            pool = getattr(self, name, None)
+            if pool is not None:
+                pool.shutdown(wait=False)
+
+    def _scrape_locked(self, scraper: MintScraper) -> None:
+        """Run a scrape unless one is already in flight."""
+        if not self._scrape_lock.acquire(blocking=False):
+            self.log("-- Scrape already in progress - skipping this cycle")
+            return
+        try:
+            scraper.scrape_or_load()
+        except Exception:
+            # The future from submit() is discarded, so log here or the
+            # failure (usually a Selenium/Mint login error) vanishes
+            self.error("-- Scrape failed:\n{}".format(traceback.format_exc()))
+        finally:
+            self._scrape_lock.release()
+
     def callback_get_data(self, cb_args) -> Callable:
         """Define data retrieval callback."""
         my_scraper: MintScraper = cb_args["scraper"]
-        my_scraper.scrape_or_load()
+        self._scrape_pool.submit(self._scrape_locked, my_scraper)
 
     def callback_send_data(self, cb_args) -> Callable:
         """Define MQTT Sending callback."""
@@ -107,47 +153,31 @@ class MintScrapperApp(mqtt.Mqtt):
         my_scraper: MintScraper = cb_args["scraper"]
         self.send_mqtt_data(scraper=my_scraper)
 
-    def _convert_bool_to_string(self, obj: any) -> any:
-        """Convert json bool values into string representations."""
-        if isinstance(obj, bool):
-            return str(obj).lower()
-        if isinstance(obj, list | tuple):
-            return [self._convert_bool_to_string(item) for item in obj]
-        if isinstance(obj, dict):
-            return {
-                self._convert_bool_to_string(key): self._convert_bool_to_string(value)
-                for key, value in obj.items()
-            }
-        return obj
-
     def send_mqtt_data(self, scraper: MintScraper) -> None:
         """Send data via MQTT."""
         self.log("send_mqtt_data::Sending discovery packets via MQTT")
 
-        for entry in scraper.mint_data:
-            # Process discovery messages and topics
-            for item in ["balance", "update", "error"]:
-                topic = entry[f"discovery_topic_{item}"]
-                payload = json.dumps(
-                    self._convert_bool_to_string(entry[(f"discovery_payload_{item}")]),
-                )
-                self.mqtt_publish(topic, payload)
-
-            # Process state data
-            topic = entry["state_topic"]
-            payload = json.dumps(self._convert_bool_to_string(entry["state_payload"]))
-            self.mqtt_publish(topic, payload)
-
-            self.log("send_mqtt_data::Publishing State data to {}".format(topic))
-
-            attribute_topic = entry["attribute_topic"]
-            attribute_payload = json.dumps(
-                self._convert_bool_to_string(entry["attribute_payload"])
-            )
-
-            self.log(
-                "send_mqtt_data::Publishing attribute data to {}".format(
-                    attribute_topic
-                )
-            )
-            self.mqtt_publish(attribute_topic, attribute_payload)
+        # Each entry carries a pre-serialized publish plan built at parse
+        # time. Skip any topic whose payload bytes are unchanged since the
+        # last send - messages are retained, so subscribers still see the
+        # latest value on reconnect.
+        publishes: list[tuple[str, str]] = []
+        for topic, payload in itertools.chain.from_iterable(
+            entry.publish_plan for entry in scraper.mint_data
+        ):
+            payload_hash = hash(payload)
+            if self._last_payload_hash.get(topic) == payload_hash:
+                continue
+            self._last_payload_hash[topic] = payload_hash
+            publishes.append((topic, payload))
+
+        self.log("send_mqtt_data::Publishing %d messages", len(publishes))
+
+        # Fan the publishes out over the persistent pool - each publish is a
+        # blocking network round-trip so the serial loop dominated wall clock
+        list(
+            self._publish_pool.map(
+                lambda pair: self.mqtt_publish(*pair, retain=True),
+                publishes,
+            ),
+        )